@@ -6,6 +6,10 @@ import numpy as np
 import os
 from datetime import datetime, timedelta
 import json
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from kernels import rolling_mean_2d
 
 # Set page configuration
 st.set_page_config(
@@ -15,64 +19,135 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-# Custom CSS for theming
-def local_css():
-    st.markdown("""
-    <style>
-        .main {
-            background-color: #f5f5f5;
-        }
-        .stApp {
-            max-width: 1200px;
-            margin: 0 auto;
-        }
-        h1, h2, h3 {
-            color: #1E3A8A;
-        }
-        .stMetric {
-            background-color: #ffffff;
-            border-radius: 5px;
-            padding: 15px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        }
-        .stPlotlyChart {
-            background-color: white;
-            border-radius: 5px;
-            padding: 10px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        }
-        .sidebar .sidebar-content {
-            background-color: #1E3A8A;
-            color: white;
-        }
-        .sidebar .sidebar-content .stRadio label {
-            color: white;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+# Custom CSS for what the theme in .streamlit/config.toml cannot express
+CARD_CSS = """
+<style>
+    .stApp {
+        max-width: 1200px;
+        margin: 0 auto;
+    }
+    h1, h2, h3 {
+        color: #1E3A8A;
+    }
+    .stMetric, .stPlotlyChart {
+        background-color: #ffffff;
+        border-radius: 5px;
+        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+    }
+    .stMetric {
+        padding: 15px;
+    }
+    .stPlotlyChart {
+        padding: 10px;
+    }
+</style>
+"""
 
-local_css()
+st.markdown(CARD_CSS, unsafe_allow_html=True)
 
-# Load data function
+# Load date bounds, sorted country list and update time of the stored dataset
 @st.cache_data(ttl=3600)
-def load_data():
+def load_metadata():
     try:
-        df = pd.read_csv('data/processed_covid_data.csv')
-        df['date'] = pd.to_datetime(df['date'])
+        dataset = ds.dataset('data/covid_ds', format='parquet', partitioning='hive')
+        table = dataset.to_table(columns=['date', 'country'])
         with open('data/last_updated.txt', 'r') as f:
             last_updated = f.read().strip()
-        return df, last_updated
     except FileNotFoundError:
         st.error("Data files not found. Please run the data pipeline notebook first.")
         st.stop()
+    date_bounds = pc.min_max(table['date'])
+    min_date = pd.Timestamp(date_bounds['min'].as_py())
+    max_date = pd.Timestamp(date_bounds['max'].as_py())
+    countries = sorted(pc.unique(table['country'].cast(pa.string())).to_pylist())
+    return min_date, max_date, countries, last_updated
+
+# Load data function; only the year partitions and row groups in range are read
+@st.cache_data(ttl=3600, max_entries=10)
+def load_data(start_date, end_date, countries):
+    dataset = ds.dataset('data/covid_ds', format='parquet', partitioning='hive')
+    date_filter = (
+        (ds.field('year') >= start_date.year) & (ds.field('year') <= end_date.year) &
+        (ds.field('date') >= start_date) & (ds.field('date') <= end_date)
+    )
+    df = dataset.to_table(filter=date_filter).to_pandas().drop(columns='year')
+    # Rows are stored in date order; this is the one place that sorts them by
+    # country category code, then date, which country_date_rows relies on
+    df['country'] = pd.Categorical(df['country'], categories=countries)
+    return df.sort_values(['country', 'date']).reset_index(drop=True)
+
+# Load precomputed per-view tables
+@st.cache_data(ttl=3600)
+def load_precomputed():
+    try:
+        latest = pd.read_parquet('data/latest_snapshot.parquet')
+        top20 = pd.read_parquet('data/top20_by_metric.parquet')
+        vaccination = pd.read_parquet('data/vaccination_rates.parquet')
+    except FileNotFoundError:
+        return None
+    return {
+        'latest': latest,
+        'top20': {m: g.drop(columns='metric') for m, g in top20.groupby('metric')},
+        'vaccination': vaccination,
+    }
+
+# Shared layout settings for the time-series and bar charts
+@st.cache_resource
+def get_layout_template(kind):
+    if kind == "time_series":
+        return dict(xaxis_title="Date", legend_title="Country", hovermode="x unified")
+    return dict(xaxis_title="Country", xaxis={'categoryorder':'total descending'})
+
+# Pivot a metric into a date x country frame using the country category codes
+def fast_pivot(df, metric):
+    dates = pd.Index(np.sort(df['date'].unique()), name='date')
+    d_idx = dates.get_indexer(df['date'])
+    used_codes, c_idx = np.unique(df['country'].cat.codes.to_numpy(), return_inverse=True)
+    mat = np.full((len(dates), len(used_codes)), np.nan)
+    mat[d_idx, c_idx] = df[metric].to_numpy(dtype=float, na_value=np.nan)
+    columns = pd.Index(df['country'].cat.categories[used_codes], name='country')
+    return pd.DataFrame(mat, index=dates, columns=columns)
+
+# Boolean mask of rows for the given countries, compared on category codes
+def country_mask(df, countries):
+    codes = df['country'].cat.categories.get_indexer(list(countries))
+    return np.isin(df['country'].cat.codes.to_numpy(), codes[codes >= 0])
+
+# Row positions for the given countries within a date range, found by binary
+# search; rows must be sorted by country category code, then date, as
+# load_data returns them
+def country_date_rows(df, countries, start_date, end_date):
+    codes = df['country'].cat.codes.to_numpy()
+    dates = df['date'].to_numpy()
+    selected = df['country'].cat.categories.get_indexer(list(countries))
+    selected = np.unique(selected[selected >= 0])
+    lo = np.searchsorted(codes, selected, side='left')
+    hi = np.searchsorted(codes, selected, side='right')
+    start, end = np.datetime64(start_date), np.datetime64(end_date)
+    rows = [
+        np.arange(a + np.searchsorted(dates[a:b], start),
+                  a + np.searchsorted(dates[a:b], end, side='right'))
+        for a, b in zip(lo, hi)
+    ]
+    return np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+
+# Downsample long time series to weekly or monthly means
+def downsample(series_data):
+    if series_data.empty:
+        return series_data
+    span = (series_data.index.max() - series_data.index.min()).days
+    if span <= 500:
+        return series_data
+    freq = 'W' if span <= 2000 else 'M'
+    return series_data.resample(freq).mean()
 
 # Main function
 def main():
     # Header
     st.title("🦠 COVID-19 Trends Dashboard")
     
-    # Load data
-    data, last_updated = load_data()
+    # Load data bounds
+    min_date, max_date, countries, last_updated = load_metadata()
     
     # Last updated info
     st.markdown(f"*Last updated: {last_updated}*")
@@ -81,7 +156,6 @@ def main():
     st.sidebar.title("Filters")
     
     # Country filter
-    countries = sorted(data['country'].unique())
     selected_countries = st.sidebar.multiselect(
         "Select Countries",
         options=countries,
@@ -91,9 +165,9 @@ def main():
     # Date filter
     date_range = st.sidebar.date_input(
         "Date Range",
-        value=(data['date'].min().date(), data['date'].max().date()),
-        min_value=data['date'].min().date(),
-        max_value=data['date'].max().date()
+        value=(min_date.date(), max_date.date()),
+        min_value=min_date.date(),
+        max_value=max_date.date()
     )
     
     # Metric filter
@@ -109,35 +183,61 @@ def main():
     view_options = ["Overview", "Time Series Analysis", "Country Comparison", "Vaccination Progress"]
     selected_view = st.sidebar.radio("Select View", view_options)
     
-    # Filter data
+    # Load the selected date range and filter by countries
+    start_date = pd.Timestamp(date_range[0])
+    end_date = pd.Timestamp(date_range[1])
+    data = load_data(start_date, end_date, tuple(countries))
     if selected_countries:
-        filtered_data = data[data['country'].isin(selected_countries)]
+        filtered_data = data.iloc[country_date_rows(data, selected_countries, start_date, end_date)]
     else:
         filtered_data = data
     
-    # Date range filter
-    start_date = pd.Timestamp(date_range[0])
-    end_date = pd.Timestamp(date_range[1])
-    filtered_data = filtered_data[(filtered_data['date'] >= start_date) & 
-                                 (filtered_data['date'] <= end_date)]
+    # Precomputed tables only describe the unfiltered latest data
+    views = None
+    if not selected_countries and end_date >= max_date:
+        views = load_precomputed()
+        # A country whose last report predates the range would wrongly be included
+        if views is not None and views['latest']['date'].min() < start_date:
+            views = None
+    
+    # Latest row per country, shared by the snapshot views
+    if views is not None:
+        latest_snapshot = views['latest']
+    else:
+        latest_idx = filtered_data.groupby('country', observed=True, sort=False)['date'].idxmax()
+        latest_snapshot = filtered_data.loc[latest_idx]
     
     # Show selected view
     if selected_view == "Overview":
-        display_overview(filtered_data)
+        display_overview(latest_snapshot, views)
     elif selected_view == "Time Series Analysis":
-        display_time_series(filtered_data, selected_metric, selected_countries)
+        display_time_series(filtered_data, selected_metric, selected_countries, start_date, end_date)
     elif selected_view == "Country Comparison":
-        display_country_comparison(filtered_data, selected_metric)
+        display_country_comparison(latest_snapshot, selected_metric, views)
     elif selected_view == "Vaccination Progress":
-        display_vaccination_progress(filtered_data)
+        view_countries = sorted(selected_countries) if selected_countries else countries
+        display_vaccination_progress(filtered_data, latest_snapshot, view_countries,
+                                     start_date, end_date, views)
 
-def display_overview(data):
+# Build the cases map once per snapshot; the frame itself is not hashed
+@st.cache_data(ttl=3600)
+def build_choropleth_json(latest_date, countries, _latest_data):
+    fig = px.choropleth(
+        _latest_data,
+        locations="iso_code",
+        color="total_cases",
+        hover_name="country",
+        color_continuous_scale="Viridis",
+        title="Total Confirmed Cases by Country",
+        projection="natural earth"
+    )
+    fig.update_layout(margin=dict(l=0, r=0, b=0, t=30), height=500)
+    return fig.to_json()
+
+def display_overview(latest_data, views=None):
     st.header("Global COVID-19 Overview")
     
     # Calculate summary stats
-    latest_date = data['date'].max()
-    latest_data = data[data['date'] == latest_date]
-    
     total_cases = latest_data['total_cases'].sum()
     total_deaths = latest_data['total_deaths'].sum()
     avg_mortality = (total_deaths / total_cases) * 100 if total_cases > 0 else 0
@@ -156,21 +256,19 @@ def display_overview(data):
     
     # Create a world map of cases
     st.subheader("Global Distribution of Cases")
-    fig = px.choropleth(
-        latest_data,
-        locations="iso_code",
-        color="total_cases",
-        hover_name="country",
-        color_continuous_scale="Viridis",
-        title="Total Confirmed Cases by Country",
-        projection="natural earth"
+    fig_json = build_choropleth_json(
+        str(latest_data['date'].max()),
+        tuple(sorted(latest_data['country'].astype(str))),
+        latest_data
     )
-    fig.update_layout(margin=dict(l=0, r=0, b=0, t=30), height=500)
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(go.Figure(json.loads(fig_json)), use_container_width=True)
     
     # Top countries table
     st.subheader("Top 10 Countries by Confirmed Cases")
-    top_countries = latest_data.sort_values('total_cases', ascending=False).head(10)
+    if views is not None:
+        top_countries = views['top20']['total_cases'].head(10)
+    else:
+        top_countries = latest_data.nlargest(10, 'total_cases')
     top_countries = top_countries[['country', 'total_cases', 'total_deaths', 'people_fully_vaccinated']]
     top_countries.columns = ['Country', 'Total Cases', 'Total Deaths', 'Fully Vaccinated']
     top_countries = top_countries.reset_index(drop=True)
@@ -180,29 +278,68 @@ def display_overview(data):
         'Fully Vaccinated': '{:,.0f}'
     }), use_container_width=True)
 
-def display_time_series(data, metric, countries):
+# Filtered frames are fingerprinted by size and latest date rather than hashed in full;
+# the builders also take the date range so it is always part of the cache key
+FRAME_HASH_FUNCS = {pd.DataFrame: lambda d: (len(d), d['date'].max())}
+
+# Build a line chart of one metric for the given countries
+@st.cache_data(ttl=3600, hash_funcs=FRAME_HASH_FUNCS)
+def build_line_fig(data, metric, countries, start_date, end_date, title, y_label):
+    pivot_data = fast_pivot(data[country_mask(data, countries)], metric)
+    plot_data = downsample(pivot_data)
+    fig = px.line(
+        plot_data,
+        x=plot_data.index,
+        y=[c for c in countries if c in plot_data.columns],
+        title=title,
+        labels={'date': 'Date', 'value': y_label},
+        render_mode='webgl'
+    )
+    fig.update_layout(
+        **get_layout_template("time_series"),
+        yaxis_title=y_label
+    )
+    return fig
+
+# Build the moving-average chart of one metric for the given countries
+@st.cache_data(ttl=3600, hash_funcs=FRAME_HASH_FUNCS)
+def build_moving_average_fig(data, metric, countries, start_date, end_date, window_size):
+    pivot_data = fast_pivot(data[country_mask(data, countries)], metric)
+    ma_data = pivot_data[[c for c in countries if c in pivot_data.columns]]
+    ma_values = rolling_mean_2d(np.ascontiguousarray(ma_data.to_numpy(dtype=np.float64)), window_size)
+    ma_data = downsample(pd.DataFrame(ma_values, index=ma_data.index, columns=ma_data.columns))
+    ma_fig = go.Figure()
+    for country in ma_data.columns:
+        ma_fig.add_trace(go.Scattergl(
+            x=ma_data.index,
+            y=ma_data[country].to_numpy(),
+            mode='lines',
+            name=f"{country} ({window_size}-day MA)"
+        ))
+    
+    ma_fig.update_layout(
+        **get_layout_template("time_series"),
+        title=f"{window_size}-Day Moving Average of {metric.replace('_', ' ').title()}",
+        yaxis_title=f"{metric.replace('_', ' ').title()} (Moving Average)"
+    )
+    return ma_fig
+
+def display_time_series(data, metric, countries, start_date, end_date):
     st.header(f"Time Series Analysis: {metric.replace('_', ' ').title()}")
     
     if not countries:
         st.warning("Please select at least one country from the sidebar.")
         return
     
-    # Prepare time series data
-    pivot_data = data.pivot(index='date', columns='country', values=metric)
-    
     # Create line chart
-    fig = px.line(
-        pivot_data,
-        x=pivot_data.index,
-        y=countries,
-        title=f"{metric.replace('_', ' ').title()} Over Time",
-        labels={'date': 'Date', 'value': metric.replace('_', ' ').title()}
-    )
-    fig.update_layout(
-        xaxis_title="Date",
-        yaxis_title=metric.replace('_', ' ').title(),
-        legend_title="Country",
-        hovermode="x unified"
+    fig = build_line_fig(
+        data,
+        metric,
+        tuple(countries),
+        start_date,
+        end_date,
+        f"{metric.replace('_', ' ').title()} Over Time",
+        metric.replace('_', ' ').title()
     )
     st.plotly_chart(fig, use_container_width=True)
     
@@ -211,48 +348,41 @@ def display_time_series(data, metric, countries):
     window_size = st.slider("Select Moving Average Window (days)", 1, 30, 7)
     
     # Calculate moving averages for selected countries
-    ma_fig = go.Figure()
-    for country in countries:
-        if country in pivot_data.columns:
-            ma_data = pivot_data[country].rolling(window=window_size).mean()
-            ma_fig.add_trace(go.Scatter(
-                x=pivot_data.index,
-                y=ma_data,
-                mode='lines',
-                name=f"{country} ({window_size}-day MA)"
-            ))
-    
-    ma_fig.update_layout(
-        title=f"{window_size}-Day Moving Average of {metric.replace('_', ' ').title()}",
-        xaxis_title="Date",
-        yaxis_title=f"{metric.replace('_', ' ').title()} (Moving Average)",
-        hovermode="x unified"
-    )
+    ma_fig = build_moving_average_fig(data, metric, tuple(countries), start_date, end_date, window_size)
     st.plotly_chart(ma_fig, use_container_width=True)
 
-def display_country_comparison(data, metric):
+# Build a top-countries bar chart; the ranked tables are small enough to hash in full
+@st.cache_data(ttl=3600)
+def build_bar_fig(bar_data, column, title, y_label):
+    fig = px.bar(
+        bar_data,
+        x='country',
+        y=column,
+        title=title,
+        color=column,
+        labels={column: y_label, 'country': 'Country'}
+    )
+    fig.update_layout(
+        **get_layout_template("bar"),
+        yaxis_title=y_label
+    )
+    return fig
+
+def display_country_comparison(latest_data, metric, views=None):
     st.header(f"Country Comparison: {metric.replace('_', ' ').title()}")
     
-    # Get latest data for comparison
-    latest_date = data['date'].max()
-    latest_data = data[data['date'] == latest_date]
-    
     # Sort countries by the selected metric
-    sorted_data = latest_data.sort_values(by=metric, ascending=False).head(20)
+    if views is not None:
+        sorted_data = views['top20'][metric]
+    else:
+        sorted_data = latest_data.nlargest(20, metric)
     
     # Create bar chart
-    fig = px.bar(
+    fig = build_bar_fig(
         sorted_data,
-        x='country',
-        y=metric,
-        title=f"Top 20 Countries by {metric.replace('_', ' ').title()}",
-        color=metric,
-        labels={metric: metric.replace('_', ' ').title(), 'country': 'Country'}
-    )
-    fig.update_layout(
-        xaxis_title="Country",
-        yaxis_title=metric.replace('_', ' ').title(),
-        xaxis={'categoryorder':'total descending'}
+        metric,
+        f"Top 20 Countries by {metric.replace('_', ' ').title()}",
+        metric.replace('_', ' ').title()
     )
     st.plotly_chart(fig, use_container_width=True)
     
@@ -270,31 +400,23 @@ def display_country_comparison(data, metric):
         per_capita_title = per_capita_options[metric]
         
         # Sort countries by the per capita metric
-        per_capita_data = latest_data.sort_values(by=per_capita_metric, ascending=False).head(20)
+        if views is not None:
+            per_capita_data = views['top20'][per_capita_metric]
+        else:
+            per_capita_data = latest_data.nlargest(20, per_capita_metric)
         
         # Create per capita bar chart
-        per_capita_fig = px.bar(
+        per_capita_fig = build_bar_fig(
             per_capita_data,
-            x='country',
-            y=per_capita_metric,
-            title=f"Top 20 Countries by {per_capita_title}",
-            color=per_capita_metric,
-            labels={per_capita_metric: per_capita_title, 'country': 'Country'}
-        )
-        per_capita_fig.update_layout(
-            xaxis_title="Country",
-            yaxis_title=per_capita_title,
-            xaxis={'categoryorder':'total descending'}
+            per_capita_metric,
+            f"Top 20 Countries by {per_capita_title}",
+            per_capita_title
         )
         st.plotly_chart(per_capita_fig, use_container_width=True)
 
-def display_vaccination_progress(data):
+def display_vaccination_progress(data, latest_data, countries, start_date, end_date, views=None):
     st.header("Vaccination Progress")
     
-    # Latest vaccination data
-    latest_date = data['date'].max()
-    latest_data = data[data['date'] == latest_date]
-    
     # Metrics for vaccination
     col1, col2 = st.columns(2)
     
@@ -310,23 +432,18 @@ def display_vaccination_progress(data):
     # Top countries by vaccination rate
     st.subheader("Top Countries by Vaccination Rate")
     
-    # Calculate vaccination rate
-    latest_data['vaccination_rate'] = latest_data['people_fully_vaccinated'] / latest_data['population'] * 100
-    top_vaccinated = latest_data.dropna(subset=['vaccination_rate']).sort_values('vaccination_rate', ascending=False).head(20)
+    # Rank countries by vaccination rate
+    if views is not None:
+        top_vaccinated = views['vaccination'].head(20)
+    else:
+        top_vaccinated = latest_data.dropna(subset=['vaccination_rate']).nlargest(20, 'vaccination_rate')
     
     # Create bar chart for vaccination rate
-    vax_fig = px.bar(
+    vax_fig = build_bar_fig(
         top_vaccinated,
-        x='country',
-        y='vaccination_rate',
-        title="Top 20 Countries by Vaccination Rate (%)",
-        color='vaccination_rate',
-        labels={'vaccination_rate': 'Vaccination Rate (%)', 'country': 'Country'}
-    )
-    vax_fig.update_layout(
-        xaxis_title="Country",
-        yaxis_title="Vaccination Rate (%)",
-        xaxis={'categoryorder':'total descending'}
+        'vaccination_rate',
+        "Top 20 Countries by Vaccination Rate (%)",
+        "Vaccination Rate (%)"
     )
     st.plotly_chart(vax_fig, use_container_width=True)
     
@@ -334,33 +451,23 @@ def display_vaccination_progress(data):
     st.subheader("Vaccination Progress Over Time")
     
     # Country selector for vaccination trends
-    countries = sorted(data['country'].unique())
+    default_countries = ["United States", "United Kingdom", "Israel", "Canada"]
     selected_countries = st.multiselect(
         "Select Countries for Vaccination Trends",
         options=countries,
-        default=["United States", "United Kingdom", "Israel", "Canada"]
+        default=[c for c in default_countries if c in countries]
     )
     
     if selected_countries:
-        # Filter data for selected countries
-        vax_data = data[data['country'].isin(selected_countries)]
-        
-        # Pivot data for plotting
-        pivot_vax_data = vax_data.pivot(index='date', columns='country', values='people_fully_vaccinated_per_hundred')
-        
         # Create line chart
-        vax_trend_fig = px.line(
-            pivot_vax_data,
-            x=pivot_vax_data.index,
-            y=selected_countries,
-            title="Vaccination Rate Over Time (% of Population)",
-            labels={'date': 'Date', 'value': 'Fully Vaccinated (%)'}
-        )
-        vax_trend_fig.update_layout(
-            xaxis_title="Date",
-            yaxis_title="Fully Vaccinated (%)",
-            legend_title="Country",
-            hovermode="x unified"
+        vax_trend_fig = build_line_fig(
+            data,
+            'people_fully_vaccinated_per_hundred',
+            tuple(selected_countries),
+            start_date,
+            end_date,
+            "Vaccination Rate Over Time (% of Population)",
+            "Fully Vaccinated (%)"
         )
         st.plotly_chart(vax_trend_fig, use_container_width=True)
 
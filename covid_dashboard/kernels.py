@@ -0,0 +1,83 @@
+import numpy as np
+from numba import njit, prange, float64, int64
+
+# Compiled with an explicit signature so the cost is paid at import, not on
+# the first user interaction
+@njit(float64[:, ::1](float64[:, ::1], int64), parallel=True, cache=True)
+def rolling_mean_2d(mat, window):
+    """
+    Trailing moving average down each column of a date x country matrix.
+
+    Follows pandas' rolling(window, min_periods=1).mean(): NaN values are
+    skipped, the running sum uses Kahan-compensated adds and removes, and a
+    window holding one repeated value returns that value exactly.
+
+    Args:
+        mat (numpy.ndarray): C-contiguous float64 matrix with one column per series.
+        window (int): Number of rows in the moving window.
+
+    Returns:
+        numpy.ndarray: Moving averages with the same shape as mat.
+    """
+    n_rows, n_cols = mat.shape
+    out = np.empty_like(mat)
+    for j in prange(n_cols):
+        total = 0.0
+        comp_add = 0.0
+        comp_remove = 0.0
+        count = 0
+        neg_count = 0
+        same_count = 0
+        prev_value = 0.0
+        for i in range(n_rows):
+            start = max(0, i - window + 1)
+            if i == 0 or start >= i:
+                # Window does not overlap the previous one; start afresh
+                total = 0.0
+                comp_add = 0.0
+                comp_remove = 0.0
+                count = 0
+                neg_count = 0
+                same_count = 0
+                prev_value = mat[start, j]
+                first = start
+            else:
+                # Remove the row that left the window
+                first = i
+                if start > 0:
+                    old = mat[start - 1, j]
+                    if not np.isnan(old):
+                        count -= 1
+                        y = -old - comp_remove
+                        t = total + y
+                        comp_remove = t - total - y
+                        total = t
+                        if np.signbit(old):
+                            neg_count -= 1
+            for k in range(first, i + 1):
+                value = mat[k, j]
+                if not np.isnan(value):
+                    count += 1
+                    y = value - comp_add
+                    t = total + y
+                    comp_add = t - total - y
+                    total = t
+                    if np.signbit(value):
+                        neg_count += 1
+                    if value == prev_value:
+                        same_count += 1
+                    else:
+                        same_count = 1
+                    prev_value = value
+            if count > 0:
+                result = total / count
+                if same_count >= count:
+                    result = prev_value
+                elif neg_count == 0 and result < 0:
+                    result = 0.0
+                elif neg_count == count and result > 0:
+                    result = 0.0
+                out[i, j] = result
+            else:
+                out[i, j] = np.nan
+    return out
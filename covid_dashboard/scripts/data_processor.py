@@ -4,6 +4,9 @@ from datetime import datetime
 import os
 import requests
 import logging
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import csv as pacsv
 
 # Set up logging
 logging.basicConfig(
@@ -22,6 +25,28 @@ class COVIDDataProcessor:
     Class to fetch and process COVID-19 data from Our World in Data.
     """
     
+    # Columns used by the dashboard; everything else in the source file is skipped
+    columns_to_keep = [
+        'iso_code', 'continent', 'location', 'date', 
+        'total_cases', 'new_cases', 'total_deaths', 'new_deaths',
+        'total_cases_per_million', 'new_cases_per_million',
+        'total_deaths_per_million', 'new_deaths_per_million',
+        'reproduction_rate', 'icu_patients', 'hosp_patients',
+        'total_tests', 'new_tests', 'total_vaccinations',
+        'people_vaccinated', 'people_fully_vaccinated',
+        'new_vaccinations', 'population', 'population_density',
+        'median_age', 'gdp_per_capita', 'hospital_beds_per_thousand',
+        'people_fully_vaccinated_per_hundred'
+    ]
+    
+    # Metrics the dashboard ranks countries by in its bar charts
+    ranking_metrics = [
+        'new_cases', 'new_deaths', 'total_cases', 'total_deaths',
+        'new_vaccinations', 'people_fully_vaccinated',
+        'new_cases_per_million', 'new_deaths_per_million',
+        'total_cases_per_million', 'total_deaths_per_million'
+    ]
+    
     def __init__(self, data_dir='../data'):
         """
         Initialize the data processor.
@@ -31,8 +56,11 @@ class COVIDDataProcessor:
         """
         self.data_dir = data_dir
         self.data_url = 'https://covid.ourworldindata.org/data/owid-covid-data.csv'
-        self.processed_file = os.path.join(data_dir, 'processed_covid_data.csv')
+        self.processed_dir = os.path.join(data_dir, 'covid_ds')
         self.last_updated_file = os.path.join(data_dir, 'last_updated.txt')
+        self.latest_snapshot_file = os.path.join(data_dir, 'latest_snapshot.parquet')
+        self.top20_file = os.path.join(data_dir, 'top20_by_metric.parquet')
+        self.vaccination_rates_file = os.path.join(data_dir, 'vaccination_rates.parquet')
         
         # Create data directory if it doesn't exist
         os.makedirs(data_dir, exist_ok=True)
@@ -46,13 +74,42 @@ class COVIDDataProcessor:
         """
         logger.info(f"Fetching data from {self.data_url}")
         try:
-            df = pd.read_csv(self.data_url)
+            with requests.get(self.data_url, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                df = self.parse_csv(response.raw)
             logger.info(f"Data fetched successfully. Shape: {df.shape}")
             return df
         except Exception as e:
             logger.error(f"Error fetching data: {e}")
             raise
     
+    def parse_csv(self, source):
+        """
+        Parse OWID CSV data with PyArrow, materializing only columns_to_keep.
+        
+        Args:
+            source: Path or binary file-like object holding the CSV.
+            
+        Returns:
+            pandas.DataFrame: Raw COVID-19 data.
+        """
+        convert_options = pacsv.ConvertOptions(
+            include_columns=self.columns_to_keep,
+            include_missing_columns=True,
+            strings_can_be_null=True,
+            column_types={'date': pa.timestamp('ns')}
+        )
+        table = pacsv.read_csv(source, convert_options=convert_options)
+        
+        # Columns missing from the source or empty in this download come
+        # back as null type; keep them as all-NaN float columns
+        table = table.cast(pa.schema([
+            pa.field(field.name, pa.float64()) if pa.types.is_null(field.type) else field
+            for field in table.schema
+        ]))
+        return table.to_pandas()
+    
     def clean_data(self, df):
         """
         Clean and preprocess the COVID-19 data.
@@ -68,38 +125,29 @@ class COVIDDataProcessor:
         # Convert date column to datetime
         df['date'] = pd.to_datetime(df['date'])
         
-        # Select relevant columns
-        columns_to_keep = [
-            'iso_code', 'continent', 'location', 'date', 
-            'total_cases', 'new_cases', 'total_deaths', 'new_deaths',
-            'total_cases_per_million', 'new_cases_per_million',
-            'total_deaths_per_million', 'new_deaths_per_million',
-            'reproduction_rate', 'icu_patients', 'hosp_patients',
-            'total_tests', 'new_tests', 'total_vaccinations',
-            'people_vaccinated', 'people_fully_vaccinated',
-            'new_vaccinations', 'population', 'population_density',
-            'median_age', 'gdp_per_capita', 'hospital_beds_per_thousand',
-            'people_fully_vaccinated_per_hundred'
-        ]
-        
-        # Only keep columns that exist in the dataframe
-        columns_to_keep = [col for col in columns_to_keep if col in df.columns]
-        df = df[columns_to_keep].copy()
-        
         # Rename location to country for clarity
         df = df.rename(columns={'location': 'country'})
         
+        # Group on small integer codes rather than country strings
+        df['country'] = df['country'].astype('category')
+        
         # Fill missing values with appropriate methods
         numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns
-        for col in numeric_cols:
-            # For cumulative columns like total_cases, forward fill
-            if col.startswith('total_'):
-                df[col] = df.groupby('country')[col].fillna(method='ffill')
-            # For rate columns, use median by country
-            elif col.endswith('_rate') or col.endswith('_density'):
-                df[col] = df.groupby('country')[col].transform(
-                    lambda x: x.fillna(x.median())
-                )
+        total_cols = [col for col in numeric_cols if col.startswith('total_')]
+        rate_cols = [col for col in numeric_cols
+                     if col.endswith('_rate') or col.endswith('_density')]
+        
+        # For cumulative columns like total_cases, forward fill
+        if total_cols:
+            df[total_cols] = df.groupby('country', sort=False, observed=True)[total_cols].ffill()
+        
+        # For rate columns, use median by country
+        if rate_cols:
+            medians = df.groupby('country', sort=False, observed=True)[rate_cols].transform('median')
+            df[rate_cols] = df[rate_cols].fillna(medians)
+        
+        # Share of population fully vaccinated
+        df['vaccination_rate'] = df['people_fully_vaccinated'] / df['population'] * 100
         
         # Drop rows with missing critical data
         critical_cols = ['iso_code', 'country', 'date']
@@ -124,19 +172,80 @@ class COVIDDataProcessor:
         # Save processed data
         self.save_data(processed_data)
         
+        # Save the small per-view tables used by the dashboard
+        self.precompute_views(processed_data)
+        
         return processed_data
     
+    def precompute_views(self, df):
+        """
+        Build and save the latest-snapshot, top 20 and vaccination rate tables
+        so the dashboard does not have to derive them from the full dataset.
+        
+        Args:
+            df (pandas.DataFrame): Processed COVID-19 data.
+            
+        Returns:
+            dict: The latest snapshot, top 20 and vaccination rate tables.
+        """
+        logger.info("Precomputing dashboard views")
+        
+        # Latest available row for each country
+        latest_idx = df.groupby('country', sort=False, observed=True)['date'].idxmax()
+        latest = df.loc[latest_idx].reset_index(drop=True)
+        
+        # Top 20 countries for each ranking metric, stacked into one table
+        metrics = [m for m in self.ranking_metrics if m in latest.columns]
+        top20 = pd.concat(
+            [latest.nlargest(20, m).assign(metric=m) for m in metrics],
+            ignore_index=True
+        )
+        
+        # Share of population fully vaccinated, highest first
+        vaccination = latest.dropna(subset=['vaccination_rate']).sort_values(
+            'vaccination_rate', ascending=False
+        ).reset_index(drop=True)
+        
+        views = {'latest': latest, 'top20': top20, 'vaccination': vaccination}
+        for name, path in [('latest', self.latest_snapshot_file),
+                           ('top20', self.top20_file),
+                           ('vaccination', self.vaccination_rates_file)]:
+            views[name].to_parquet(path, engine='pyarrow', compression='zstd',
+                                   compression_level=3, index=False)
+        
+        logger.info(f"Dashboard views saved. Latest snapshot covers {len(latest)} countries")
+        return views
+    
     def save_data(self, df):
         """
-        Save processed data to CSV and update last updated timestamp.
+        Save processed data as a Parquet dataset partitioned by year and
+        update last updated timestamp.
         
         Args:
             df (pandas.DataFrame): Processed COVID-19 data to save.
         """
-        logger.info(f"Saving processed data to {self.processed_file}")
+        logger.info(f"Saving processed data to {self.processed_dir}")
         
-        # Save to CSV
-        df.to_csv(self.processed_file, index=False)
+        # Save to Parquet with categorical string columns; dates keep their dtype.
+        # Year partitions let the dashboard read only the years it displays, and
+        # rows are written in date order so each row group covers a narrow date
+        # span that date filters can skip. The dashboard's load_data sorts rows
+        # by country and date after reading.
+        df = df.astype({'country': 'category', 'iso_code': 'category', 'continent': 'category'})
+        df = df.sort_values('date', kind='stable')
+        table = pa.Table.from_pandas(df.assign(year=df['date'].dt.year), preserve_index=False)
+        ds.write_dataset(
+            table,
+            self.processed_dir,
+            format='parquet',
+            partitioning=['year'],
+            partitioning_flavor='hive',
+            existing_data_behavior='delete_matching',
+            max_rows_per_group=50000,
+            file_options=ds.ParquetFileFormat().make_write_options(
+                compression='zstd', compression_level=3
+            )
+        )
         
         # Update last updated timestamp
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
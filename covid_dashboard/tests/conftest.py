@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The dashboard modules are run as scripts from covid_dashboard/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
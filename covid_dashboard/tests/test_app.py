@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+@pytest.fixture
+def covid_frame():
+    rng = np.random.default_rng(0)
+    countries = ["Brazil", "Canada", "India", "Israel", "United Kingdom"]
+    dates = pd.date_range("2021-01-01", periods=60)
+    df = pd.DataFrame({
+        'country': pd.Categorical(np.repeat(countries, len(dates))),
+        'date': np.tile(dates, len(countries)),
+        'new_cases': rng.random(len(countries) * len(dates)) * 1000,
+    })
+    df.loc[rng.random(len(df)) < 0.2, 'new_cases'] = np.nan
+    # Drop some rows so countries cover different dates
+    df = df[rng.random(len(df)) > 0.1]
+    return df.sort_values(['country', 'date']).reset_index(drop=True)
+
+
+def test_fast_pivot_matches_pivot(covid_frame):
+    subset = covid_frame[covid_frame['country'].isin(["India", "Brazil"])]
+    expected = subset.pivot(index='date', columns='country', values='new_cases')
+    expected.columns = pd.Index(expected.columns.astype(str), name='country')
+    result = app.fast_pivot(subset, 'new_cases')
+    pd.testing.assert_frame_equal(result, expected[result.columns], check_index_type=False)
+    assert sorted(result.columns) == ["Brazil", "India"]
+
+
+@pytest.mark.parametrize("countries", [["India", "Brazil"], ["Israel", "Atlantis"], []])
+@pytest.mark.parametrize("start, end", [
+    ("2021-01-01", "2021-03-01"),
+    ("2021-01-15", "2021-02-10"),
+    ("2020-06-01", "2020-07-01"),
+])
+def test_country_date_rows_matches_boolean_masks(covid_frame, countries, start, end):
+    start_date, end_date = pd.Timestamp(start), pd.Timestamp(end)
+    expected = covid_frame[
+        covid_frame['country'].isin(countries) &
+        (covid_frame['date'] >= start_date) & (covid_frame['date'] <= end_date)
+    ]
+    rows = app.country_date_rows(covid_frame, countries, start_date, end_date)
+    pd.testing.assert_frame_equal(covid_frame.iloc[rows], expected)
@@ -0,0 +1,30 @@
+import io
+
+import numpy as np
+
+from scripts.data_processor import COVIDDataProcessor
+
+# People fully vaccinated is present but empty and icu_patients is missing
+OWID_CSV = b"""iso_code,continent,location,date,total_cases,new_cases,population,people_fully_vaccinated
+BRA,South America,Brazil,2021-01-01,10,10,200,
+BRA,South America,Brazil,2021-01-02,,5,200,
+OWID_WRL,,World,2021-01-01,100,100,8000,
+,,International,2021-01-01,1,1,,
+"""
+
+
+def test_parse_and_clean_owid_csv(tmp_path):
+    processor = COVIDDataProcessor(data_dir=str(tmp_path))
+    df = processor.clean_data(processor.parse_csv(io.BytesIO(OWID_CSV)))
+    
+    # Blank iso_code is missing critical data
+    assert sorted(df['country']) == ['Brazil', 'Brazil', 'World']
+    # Blank strings are NaN, not an empty category
+    assert df.loc[df['country'] == 'World', 'continent'].isna().all()
+    assert '' not in df['continent'].astype(object).tolist()
+    # Empty and missing numeric columns are all-NaN floats
+    assert df['people_fully_vaccinated'].dtype == np.float64
+    assert df['icu_patients'].isna().all()
+    assert df['vaccination_rate'].isna().all()
+    # Cumulative columns are forward filled per country
+    assert df.loc[df['country'] == 'Brazil', 'total_cases'].tolist() == [10.0, 10.0]
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from kernels import rolling_mean_2d
+
+
+@pytest.fixture
+def nan_matrix():
+    rng = np.random.default_rng(0)
+    mat = rng.random((1000, 5)) * 1e6 - 1e5
+    mat[rng.random(mat.shape) < 0.3] = np.nan
+    mat[100:150, 2] = np.nan
+    return mat
+
+
+@pytest.mark.parametrize("window", [1, 2, 7, 30, 2000])
+def test_rolling_mean_matches_pandas(nan_matrix, window):
+    expected = pd.DataFrame(nan_matrix).rolling(window, min_periods=1).mean().to_numpy()
+    np.testing.assert_array_equal(rolling_mean_2d(nan_matrix, window), expected)
+
+
+def test_rolling_mean_recovers_after_large_values_leave_window():
+    mat = np.ascontiguousarray(np.r_[np.full(10, 1e16), np.ones(30)][:, None])
+    result = rolling_mean_2d(mat, 10)
+    np.testing.assert_array_equal(result[-20:, 0], np.ones(20))